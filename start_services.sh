@@ -4,14 +4,19 @@ set -e
 # Ensure the logs folder exists
 mkdir -p logs
 
+# Served over ASGI: the account event stream holds connections open.
 echo "Starting Django server..."
-nohup python manage.py runserver 0.0.0.0:8000 > logs/django.log 2>&1 &
+nohup uvicorn transaction_simulation.asgi:application --host 0.0.0.0 --port 8000 > logs/django.log 2>&1 &
 
 sleep 2
 
 echo "Starting Celery worker..."
 nohup celery -A transaction_simulation worker --loglevel=info > logs/celery.log 2>&1 &
 
+echo "Starting Celery beat..."
+nohup celery -A transaction_simulation beat --loglevel=info > logs/celery_beat.log 2>&1 &
+
 echo "All services started successfully!"
 echo "Django server → logs/django.log"
 echo "Celery worker → logs/celery.log"
+echo "Celery beat → logs/celery_beat.log"
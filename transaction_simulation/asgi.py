@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transaction_simulation.settings')
 
 application = get_asgi_application()
+
+# uvicorn does not serve static files the way runserver does; keep the admin
+# usable in development.
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
@@ -50,6 +50,36 @@ CACHES = {
     }
 }
 
+# Settings dicts for the transactions app. Only overrides are listed here; every
+# key and its default is documented in transactions/conf.py. Also available:
+# TRANSACTION_HISTORY_CACHE, ACCOUNT_EVENTS and JWT_BLACKLIST.
+
+# Ledger reconciliation, see `manage.py reconcile_ledger`.
+LEDGER_RECONCILIATION = {
+    'REPORT_DIR': BASE_DIR / 'reports',
+}
+
+# Per-account velocity limits enforced with Redis rolling counters.
+# Each rule caps the number of transactions and/or their total amount within `window` seconds.
+VELOCITY_LIMITS = {
+    'RULES': {
+        'withdrawal': [
+            {'window': 60 * 60, 'max_count': 20, 'max_amount': '10000.00'},
+        ],
+        'deposit': [
+            {'window': 60 * 60, 'max_count': 50},
+        ],
+    },
+}
+
+# Admin changelists show planner-estimated counts above this many rows, see transactions/pagination.py.
+ADMIN_EXACT_COUNT_THRESHOLD = 10000
+
+# Store amounts and balances as BigIntegerField cents instead of DecimalField, see
+# transactions/money.py. Convert existing columns with `manage.py convert_money_storage`; processes
+# refuse to use a database whose columns do not match this setting.
+MONEY_MINOR_UNITS = os.getenv('MONEY_MINOR_UNITS', 'False') == 'True'
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -176,9 +206,12 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    'TOKEN_OBTAIN_SERIALIZER': 'transactions.tokens.RedisTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'transactions.tokens.RedisTokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'transactions.tokens.RedisTokenVerifySerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'transactions.tokens.RedisTokenBlacklistSerializer',
 }
 
-
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
@@ -193,3 +226,13 @@ CELERY_BROKER_URL = os.getenv('REDIS_URL')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_BACKEND = os.getenv('REDIS_URL')
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-velocity-counters': {
+        'task': 'transactions.tasks.reconcile_velocity_counters',
+        'schedule': timedelta(minutes=15),
+    },
+    'purge-token-blacklist': {
+        'task': 'transactions.tasks.purge_token_blacklist',
+        'schedule': timedelta(hours=1),
+    },
+}
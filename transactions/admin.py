@@ -1,23 +1,68 @@
 from django.contrib import admin
 from .models import Transaction, Account, User
+from .money import from_storage
+from .pagination import BoundedDateQuerySet, EstimatedCountPaginator, KeysetChangeList
+
+
+class ScalableAdminMixin:
+    """
+    Changelist settings for tables too large for COUNT(*) and OFFSET paging:
+    planner-estimated counts, keyset pagination on the primary key and a date
+    hierarchy built from Min/Max bounds.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        """
+        Returns the changelist queryset with bounded date hierarchy lookups.
+        """
+        queryset = super().get_queryset(request)
+        return BoundedDateQuerySet(model=queryset.model, query=queryset.query, using=queryset.db)
+
+    def get_changelist(self, request, **kwargs):
+        """
+        Returns the keyset-paginated ChangeList.
+        """
+        return KeysetChangeList
+
 
 # Register your models here.
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """
     Transaction Model to display,search users and transactions
     """
-    list_display = ('user', 'transaction_type', 'amount', 'timestamp')
-    search_fields = ('user__username', 'transaction_type')
-    list_filter = ('transaction_type', 'timestamp')
+    list_display = ('user', 'transaction_type', 'display_amount', 'timestamp')
+    list_select_related = ('user',)
+    search_fields = ('^user__username',)
+    list_filter = ('transaction_type',)
+    date_hierarchy = 'timestamp'
+    raw_id_fields = ('user',)
+
+    @admin.display(description='amount', ordering='amount')
+    def display_amount(self, obj):
+        """
+        Shows the amount in currency units whatever the storage representation.
+        """
+        return from_storage(obj.amount)
 
 @admin.register(Account)
-class AccountAdmin(admin.ModelAdmin):
+class AccountAdmin(ScalableAdminMixin, admin.ModelAdmin):
     """
     Account Model to list user and balance fields
     """
-    list_display = ('user', 'balance')
-    search_fields = ('user__username',)
+    list_display = ('user', 'display_balance')
+    list_select_related = ('user',)
+    search_fields = ('^user__username',)
+    raw_id_fields = ('user',)
+
+    @admin.display(description='balance', ordering='balance')
+    def display_balance(self, obj):
+        """
+        Shows the balance in currency units whatever the storage representation.
+        """
+        return from_storage(obj.balance)
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class TransactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transactions'
+
+    def ready(self):
+        # pylint: disable=import-outside-toplevel
+        from .money import check_storage_columns
+
+        connection_created.connect(check_storage_columns, dispatch_uid='check_money_storage')
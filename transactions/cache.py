@@ -0,0 +1,293 @@
+"""
+Two-tier cache used for serialized transaction history.
+
+L1 is a small in-process LRU kept by every worker, L2 is the shared
+``transaction_history`` Redis cache. Values in L2 carry a soft expiry: once
+it passes, readers keep getting the stale value while a single worker
+refreshes it in the background. Misses are rebuilt by one worker at a time
+(single-flight) and invalidations are broadcast to every worker's L1 over
+Redis pub/sub.
+
+Every key also has a generation counter in L2 that ``invalidate`` bumps.
+Values are stored with the generation their loader started under and are
+ignored once it has moved on, so a rebuild that races an invalidation can
+never bring back the data it was invalidated for.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django_redis import get_redis_connection
+
+from .conf import get_options
+
+logger = logging.getLogger(__name__)
+
+class LocalLRUCache:
+    """
+    Thread-safe, size-bounded LRU with a per-entry expiry.
+    """
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value or None when missing or expired.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry when full.
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Removes a key if present.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        with self._lock:
+            self._data.clear()
+
+
+class TwoTierCache:
+    """
+    In-process LRU in front of a Django cache alias, with single-flight
+    rebuilds, stale-while-revalidate and pub/sub invalidation.
+    """
+    def __init__(self, options=None):
+        self.options = {**get_options('TRANSACTION_HISTORY_CACHE'), **(options or {})}
+        self.local = LocalLRUCache(self.options['L1_MAX_ENTRIES'], self.options['L1_TIMEOUT'])
+        self._pid = None
+        self._listener_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        """
+        Returns the L2 Django cache.
+        """
+        return caches[self.options['ALIAS']]
+
+    def get_or_set(self, key, loader, refresh=None):
+        """
+        Returns the value for ``key``, building it with ``loader`` on a miss.
+
+        When the stored value is past its soft expiry it is returned as-is and
+        ``refresh(key, lock_token)`` is called by the one worker that wins the
+        rebuild lock; that callable must eventually call ``set`` and
+        ``release_lock``. Without ``refresh`` the winner rebuilds inline.
+        """
+        self._ensure_listener()
+        envelope = self.local.get(key)
+        # A stale L1 copy may already have been refreshed in L2 by another worker.
+        if envelope is None or envelope['fresh_until'] < time.time():
+            envelope = self._get_shared(key)
+            if envelope is not None:
+                self.local.set(key, envelope)
+
+        if envelope is not None:
+            if envelope['fresh_until'] < time.time():
+                self._revalidate(key, loader, refresh)
+            return envelope['data']
+
+        return self._load_single_flight(key, loader)
+
+    def generation(self, key):
+        """
+        Returns the current generation of a key. Read it before loading a value
+        and pass it to ``set``.
+        """
+        return self.shared.get(self._generation_key(key)) or 0
+
+    def set(self, key, value, generation=None):
+        """
+        Stores a fresh value in both tiers.
+
+        When ``generation`` is given the value is only stored if the key has not
+        been invalidated since, and readers drop it if that happens later.
+        Returns True if the value was stored.
+        """
+        current = self.generation(key)
+        if generation is None:
+            generation = current
+        elif generation != current:
+            return False
+        envelope = {
+            'data': value,
+            'fresh_until': time.time() + self.options['SOFT_TIMEOUT'],
+            'generation': generation,
+        }
+        self.shared.set(key, envelope, timeout=self.options['TIMEOUT'])
+        self.local.set(key, envelope)
+        return True
+
+    def invalidate(self, key):
+        """
+        Deletes a key from L2 and from the L1 of every worker.
+
+        Bumps the key's generation so in-flight rebuilds cannot store what they
+        loaded, and drops the rebuild lock so the next read starts a new one.
+        """
+        generation_key = self._generation_key(key)
+        self.shared.add(generation_key, 0, timeout=None)
+        self.shared.incr(generation_key)
+        self.shared.delete_many([key, self._lock_key(key)])
+        self.local.delete(key)
+        try:
+            get_redis_connection(self.options['ALIAS']).publish(
+                self.options['INVALIDATION_CHANNEL'], key
+            )
+        except Exception: # pylint: disable=broad-except
+            logger.exception("Failed to publish cache invalidation for %s", key)
+
+    def acquire_lock(self, key):
+        """
+        Tries to take the rebuild lock for a key. Returns a token or None.
+        """
+        token = uuid.uuid4().hex
+        if self.shared.add(self._lock_key(key), token, timeout=self.options['LOCK_TIMEOUT']):
+            return token
+        return None
+
+    def release_lock(self, key, token):
+        """
+        Releases the rebuild lock if it is still held with ``token``.
+        """
+        lock_key = self._lock_key(key)
+        if self.shared.get(lock_key) == token:
+            self.shared.delete(lock_key)
+
+    def _revalidate(self, key, loader, refresh):
+        token = self.acquire_lock(key)
+        if token is None:
+            return
+        if refresh is not None:
+            try:
+                refresh(key, token)
+            except Exception: # pylint: disable=broad-except
+                logger.exception("Failed to schedule cache refresh for %s", key)
+                self.release_lock(key, token)
+            return
+        try:
+            generation = self.generation(key)
+            self.set(key, loader(), generation)
+        finally:
+            self.release_lock(key, token)
+
+    def _get_shared(self, key):
+        generation_key = self._generation_key(key)
+        values = self.shared.get_many([key, generation_key])
+        envelope = values.get(key)
+        if envelope is None or envelope.get('generation', 0) != values.get(generation_key, 0):
+            return None
+        return envelope
+
+    def _load_single_flight(self, key, loader):
+        deadline = time.monotonic() + self.options['LOCK_TIMEOUT']
+        token = self.acquire_lock(key)
+        while token is None:
+            if time.monotonic() >= deadline:
+                logger.warning("Timed out waiting for cache rebuild of %s", key)
+                return loader()
+            time.sleep(self.options['LOCK_WAIT'])
+            envelope = self._get_shared(key)
+            if envelope is not None:
+                self.local.set(key, envelope)
+                return envelope['data']
+            # An invalidation drops the lock and the builder's result with it;
+            # whoever takes the lock next rebuilds for everyone still waiting.
+            token = self.acquire_lock(key)
+
+        try:
+            # The previous holder may have stored the value just before we
+            # took the lock.
+            envelope = self._get_shared(key)
+            if envelope is not None:
+                self.local.set(key, envelope)
+                return envelope['data']
+            generation = self.generation(key)
+            value = loader()
+            self.set(key, value, generation)
+            return value
+        finally:
+            self.release_lock(key, token)
+
+    def _lock_key(self, key):
+        return f"{key}:lock"
+
+    def _generation_key(self, key):
+        return f"{key}:generation"
+
+    def _ensure_listener(self):
+        """
+        Starts the invalidation subscriber once per process, including after fork.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._listener_lock:
+            if self._pid == pid:
+                return
+            self.local.clear()
+            thread = threading.Thread(
+                target=self._listen, name='transaction-history-invalidation', daemon=True
+            )
+            thread.start()
+            self._pid = pid
+
+    def _listen(self):
+        channel = self.options['INVALIDATION_CHANNEL']
+        while True:
+            try:
+                pubsub = get_redis_connection(self.options['ALIAS']).pubsub(
+                    ignore_subscribe_messages=True
+                )
+                pubsub.subscribe(channel)
+                # Anything published while we were disconnected was missed.
+                self.local.clear()
+                for message in pubsub.listen():
+                    key = message['data']
+                    if isinstance(key, bytes):
+                        key = key.decode()
+                    self.local.delete(key)
+            except Exception: # pylint: disable=broad-except
+                logger.exception("Cache invalidation listener failed, reconnecting")
+                self.local.clear()
+                time.sleep(1)
+
+
+def history_cache_key(user_id):
+    """
+    Returns the cache key for a user's transaction history.
+    """
+    return f"transaction_history_{user_id}"
+
+
+history_cache = TwoTierCache()
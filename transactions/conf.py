@@ -0,0 +1,73 @@
+"""
+Settings for the transactions app.
+
+Each feature reads one settings dict, for example ``VELOCITY_LIMITS``. Keys
+missing from it fall back to ``DEFAULTS``, so settings.py only lists what it
+overrides.
+"""
+from django.conf import settings
+
+DEFAULTS = {
+    # Two-tier (in-process LRU + Redis) cache for transaction history, see cache.py.
+    # SOFT_TIMEOUT is when an entry becomes stale and is refreshed in the
+    # background, TIMEOUT is when Redis drops it entirely.
+    'TRANSACTION_HISTORY_CACHE': {
+        'ALIAS': 'transaction_history',
+        'L1_MAX_ENTRIES': 1024,
+        'L1_TIMEOUT': 5,
+        'SOFT_TIMEOUT': 60 * 5,
+        'TIMEOUT': 60 * 15,
+        'LOCK_TIMEOUT': 10,
+        'LOCK_WAIT': 0.05,
+        'INVALIDATION_CHANNEL': 'transaction_history:invalidate',
+    },
+    # Ledger reconciliation, see reconciliation.py and `manage.py reconcile_ledger`.
+    'LEDGER_RECONCILIATION': {
+        'CHUNK_SIZE': 50000,
+        'WORKERS': 8,
+        'REPORT_DIR': 'reports',
+    },
+    # Per-account velocity limits, see velocity.py. RULES maps a transaction
+    # type to rules that cap the number of transactions and/or their total
+    # amount within `window` seconds.
+    'VELOCITY_LIMITS': {
+        'ALIAS': 'default',
+        'BUCKET_SECONDS': 60,
+        'RULES': {},
+    },
+    # Server-sent account events, see events.py. Each user keeps the last
+    # STREAM_MAXLEN events for STREAM_TIMEOUT seconds so clients can resume.
+    'ACCOUNT_EVENTS': {
+        'ALIAS': 'default',
+        'CHANNEL': 'account_events',
+        'STREAM_MAXLEN': 1000,
+        'STREAM_TIMEOUT': 60 * 60 * 24,
+        'HEARTBEAT': 15,
+        'QUEUE_SIZE': 100,
+        'RETRY': 3000,
+    },
+    # Redis JWT blacklist, see tokens.py. The Bloom filter lets each process
+    # answer "not revoked" without a Redis round trip.
+    'JWT_BLACKLIST': {
+        'ALIAS': 'default',
+        'KEY_PREFIX': 'jwt_blacklist',
+        'CHANNEL': 'jwt_blacklist:revoked',
+        'BLOOM_FILTER': True,
+        'BLOOM_CAPACITY': 100000,
+        'BLOOM_ERROR_RATE': 0.001,
+    },
+}
+
+
+def get_option(setting, name):
+    """
+    Returns one key of a settings dict, falling back to its default.
+    """
+    return getattr(settings, setting, {}).get(name, DEFAULTS[setting][name])
+
+
+def get_options(setting):
+    """
+    Returns a settings dict merged over its defaults.
+    """
+    return {**DEFAULTS[setting], **getattr(settings, setting, {})}
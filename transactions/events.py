@@ -0,0 +1,237 @@
+"""
+Account event stream: balance changes, settled transactions and failed
+settlements pushed to clients over server-sent events.
+
+Publishing appends each event to a capped per-user Redis stream, which gives
+it an id clients can resume from, and announces it on one pub/sub channel.
+Every ASGI process holds a single subscription to that channel and fans
+events out to per-connection queues, so idle connections cost one small
+queue each.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+
+import redis.asyncio as aioredis
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from .conf import get_option
+
+logger = logging.getLogger(__name__)
+
+# Pushed to a connection's queue to make it close; the client reconnects
+# with Last-Event-ID and replays whatever it missed.
+DISCONNECT = object()
+
+
+def stream_key(user_id):
+    """
+    Returns the Redis stream holding a user's recent events.
+    """
+    return f"{get_option('ACCOUNT_EVENTS', 'CHANNEL')}:{user_id}"
+
+
+def publish_event(user_id, event, data):
+    """
+    Records an event for a user and notifies every subscribed process.
+    """
+    connection = get_redis_connection(get_option('ACCOUNT_EVENTS', 'ALIAS'))
+    key = stream_key(user_id)
+    payload = json.dumps(data)
+    event_id = connection.xadd(
+        key, {'event': event, 'data': payload},
+        maxlen=get_option('ACCOUNT_EVENTS', 'STREAM_MAXLEN'), approximate=True,
+    )
+    if isinstance(event_id, bytes):
+        event_id = event_id.decode()
+    connection.expire(key, get_option('ACCOUNT_EVENTS', 'STREAM_TIMEOUT'))
+    connection.publish(get_option('ACCOUNT_EVENTS', 'CHANNEL'), json.dumps({
+        'id': event_id, 'user_id': user_id, 'event': event, 'data': payload,
+    }))
+
+
+def publish_transaction_events(instance):
+    """
+    Publishes a committed transaction and the resulting account balance.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .models import Account
+    from .money import from_storage
+    from .serializers import TransactionSerializer
+
+    publish_event(instance.user_id, 'transaction', TransactionSerializer(instance).data)
+    balance = (
+        Account.objects # pylint: disable=no-member
+        .filter(user_id=instance.user_id)
+        .values_list('balance', flat=True)
+        .first()
+    )
+    if balance is not None:
+        publish_event(instance.user_id, 'balance', {'balance': str(from_storage(balance))})
+
+
+def publish_transaction_failed(user_id, transaction_type, amount, detail):
+    """
+    Publishes a transaction that was accepted by the API but could not settle.
+    """
+    from .money import from_storage # pylint: disable=import-outside-toplevel
+
+    publish_event(user_id, 'transaction_failed', {
+        'transaction_type': transaction_type,
+        'amount': str(from_storage(amount)),
+        'detail': detail,
+    })
+
+
+def format_event(event_id, event, data):
+    """
+    Formats one server-sent event.
+    """
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+class EventBroker:
+    """
+    Per-process pub/sub subscriber that fans events out to connection queues.
+    """
+    def __init__(self):
+        self.queues = defaultdict(set)
+        self._client = None
+        self._loop = None
+        self._task = None
+
+    @property
+    def client(self):
+        """
+        Returns the asyncio Redis client for the running event loop.
+        """
+        self._ensure_listener()
+        return self._client
+
+    def subscribe(self, user_id):
+        """
+        Returns a new queue that receives the user's events.
+        """
+        self._ensure_listener()
+        queue = asyncio.Queue(maxsize=get_option('ACCOUNT_EVENTS', 'QUEUE_SIZE'))
+        self.queues[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        """
+        Stops delivering events to a queue.
+        """
+        queues = self.queues.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.queues[user_id]
+
+    async def replay(self, user_id, last_event_id):
+        """
+        Returns the user's events recorded after ``last_event_id``.
+        """
+        try:
+            entries = await self.client.xrange(stream_key(user_id), min=f"({last_event_id}")
+        except aioredis.ResponseError:
+            logger.warning("Ignoring invalid Last-Event-ID %r", last_event_id)
+            return []
+        return [(event_id, fields['event'], fields['data']) for event_id, fields in entries]
+
+    def _ensure_listener(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and not self._task.done():
+            return
+        location = settings.CACHES[get_option('ACCOUNT_EVENTS', 'ALIAS')]['LOCATION']
+        self._client = aioredis.from_url(location, decode_responses=True)
+        self._loop = loop
+        self._task = loop.create_task(self._listen())
+
+    def _deliver(self, user_id, item):
+        for queue in list(self.queues.get(user_id, ())):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Slow consumer: drop the connection and let it resume.
+                self.unsubscribe(user_id, queue)
+                queue.get_nowait()
+                queue.put_nowait(DISCONNECT)
+
+    def _disconnect_all(self):
+        for user_id in list(self.queues):
+            self._deliver(user_id, DISCONNECT)
+            self.queues.pop(user_id, None)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self._client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(get_option('ACCOUNT_EVENTS', 'CHANNEL'))
+                    async for message in pubsub.listen():
+                        event = json.loads(message['data'])
+                        self._deliver(
+                            event['user_id'], (event['id'], event['event'], event['data'])
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception: # pylint: disable=broad-except
+                logger.exception("Account event listener failed, reconnecting")
+                self._disconnect_all()
+                await asyncio.sleep(1)
+
+
+broker = EventBroker()
+
+
+def _parse_event_id(event_id):
+    try:
+        milliseconds, _, sequence = event_id.partition('-')
+        return int(milliseconds), int(sequence or 0)
+    except ValueError:
+        return None
+
+
+async def stream_events(user_id, last_event_id=None, expires_at=None):
+    """
+    Yields server-sent events for a user: missed events after
+    ``last_event_id`` first, then live events with periodic heartbeats.
+
+    The stream ends at ``expires_at`` (epoch seconds), the expiry of the token
+    it was opened with; the client reconnects with a fresh token and
+    Last-Event-ID, so no events are lost.
+    """
+    queue = broker.subscribe(user_id)
+    try:
+        yield f"retry: {get_option('ACCOUNT_EVENTS', 'RETRY')}\n\n"
+        if last_event_id:
+            for event_id, event, data in await broker.replay(user_id, last_event_id):
+                last_event_id = event_id
+                yield format_event(event_id, event, data)
+
+        last_seen = _parse_event_id(last_event_id or '')
+        while True:
+            timeout = get_option('ACCOUNT_EVENTS', 'HEARTBEAT')
+            if expires_at is not None:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    return
+                timeout = min(timeout, remaining)
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if expires_at is None or time.time() < expires_at:
+                    yield ": heartbeat\n\n"
+                continue
+            if item is DISCONNECT:
+                return
+            event_id, event, data = item
+            # Already sent during replay.
+            if last_seen is not None and _parse_event_id(event_id) <= last_seen:
+                continue
+            yield format_event(event_id, event, data)
+    finally:
+        broker.unsubscribe(user_id, queue)
@@ -0,0 +1,21 @@
+"""
+Management command that copies database-blacklisted JWTs into the Redis blacklist.
+"""
+from django.core.management.base import BaseCommand
+
+from transactions.tokens import backfill_blacklisted_tokens
+
+
+class Command(BaseCommand):
+    """
+    Copies unexpired simplejwt BlacklistedToken rows into Redis.
+    """
+    help = "Copy unexpired token_blacklist rows into the Redis JWT blacklist."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Tokens written per Redis round trip.')
+
+    def handle(self, *args, **options):
+        copied = backfill_blacklisted_tokens(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Copied {copied} blacklisted tokens to Redis."))
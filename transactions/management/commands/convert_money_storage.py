@@ -0,0 +1,64 @@
+"""
+Management command that converts stored amounts between decimal and integer
+minor-unit columns.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+
+from transactions.money import money_column_types, money_columns
+
+CONVERSIONS = {
+    'minor': 'BIGINT USING ROUND({column} * 100)::BIGINT',
+    'decimal': 'NUMERIC(10, 2) USING ({column} / 100.0)::NUMERIC(10, 2)',
+}
+
+DATA_TYPES = {
+    'minor': 'bigint',
+    'decimal': 'numeric',
+}
+
+
+class Command(BaseCommand):
+    """
+    Rewrites the balance and amount columns for MONEY_MINOR_UNITS.
+    """
+    help = ("Convert Account.balance and Transaction.amount to integer minor units "
+            "('minor') or back to decimals ('decimal').")
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=sorted(CONVERSIONS))
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print the SQL without running it.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Money storage conversion is only supported on PostgreSQL.")
+
+        # The columns are expected to disagree with MONEY_MINOR_UNITS here.
+        connection_created.disconnect(dispatch_uid='check_money_storage')
+
+        target = options['target']
+        types = money_column_types(connection)
+        statements = [
+            f'ALTER TABLE "{table}" ALTER COLUMN "{column}" TYPE '
+            + CONVERSIONS[target].format(column=f'"{column}"')
+            for table, column in money_columns()
+            # Converting twice would scale amounts by 100 again.
+            if types.get((table, column), DATA_TYPES[target]) != DATA_TYPES[target]
+        ]
+        if not statements:
+            self.stdout.write(f"Money columns are already stored as {target}.")
+            return
+        if options['dry_run']:
+            for statement in statements:
+                self.stdout.write(f"{statement};")
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        self.stdout.write(self.style.SUCCESS(
+            f"Converted money columns to {options['target']}. Set MONEY_MINOR_UNITS = "
+            f"{options['target'] == 'minor'} and restart every process."
+        ))
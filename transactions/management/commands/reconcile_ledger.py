@@ -0,0 +1,46 @@
+"""
+Management command that verifies account balances against the transaction ledger.
+"""
+from django.core.management.base import BaseCommand
+
+from transactions.reconciliation import run_reconciliation, write_report
+from transactions.tasks import reconcile_ledger
+
+
+class Command(BaseCommand):
+    """
+    Reconciles every account balance with its deposits and withdrawals.
+    """
+    help = "Verify Account.balance against the sum of each user's transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Users per range.')
+        parser.add_argument('--workers', type=int, help='Local worker threads.')
+        parser.add_argument('--repair', action='store_true',
+                            help='Reset mismatched balances to their ledger value.')
+        parser.add_argument('--output', help='Report path, defaults to REPORT_DIR.')
+        parser.add_argument('--celery', action='store_true',
+                            help='Fan ranges out to Celery workers instead of running locally.')
+
+    def handle(self, *args, **options):
+        if options['celery']:
+            task = reconcile_ledger.delay(
+                chunk_size=options['chunk_size'],
+                repair=options['repair'],
+                path=options['output'],
+            )
+            self.stdout.write(f"Queued reconciliation task {task.id}")
+            return
+
+        report = run_reconciliation(
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            repair=options['repair'],
+        )
+        path = write_report(report, options['output'])
+        style = self.style.SUCCESS if not report['mismatched'] else self.style.WARNING
+        self.stdout.write(style(
+            f"Checked {report['accounts']} accounts in {report['ranges']} ranges: "
+            f"{report['mismatched']} mismatched, {report['repaired']} repaired, "
+            f"total difference {report['total_difference']}. Report: {path}"
+        ))
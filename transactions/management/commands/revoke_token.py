@@ -0,0 +1,24 @@
+"""
+Management command that revokes refresh tokens in the Redis blacklist by JTI.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.settings import api_settings
+
+from transactions.tokens import token_blacklist
+
+
+class Command(BaseCommand):
+    """
+    Blacklists refresh tokens by JTI for as long as any refresh token can live.
+    """
+    help = "Revoke refresh tokens by JTI in the Redis JWT blacklist."
+
+    def add_arguments(self, parser):
+        parser.add_argument('jti', nargs='+', help='JTI claim of a token to revoke.')
+
+    def handle(self, *args, **options):
+        exp = time.time() + api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        revoked = token_blacklist.revoke_many((jti, exp) for jti in options['jti'])
+        self.stdout.write(self.style.SUCCESS(f"Revoked {revoked} tokens."))
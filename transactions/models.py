@@ -2,12 +2,16 @@
 Utility functions and serializers for managing transactions and account balances.
 Imports:
     - Decimal from `decimal`: For accurate representation of monetary values.
+    - money_field from `.money`: Decimal or integer minor-unit storage of amounts.
 """
 from decimal import Decimal
 from django.db.models import F
-from django.core.cache import cache
-from django.db import models
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import OpClass
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+from .cache import history_cache, history_cache_key
+from .money import from_storage, money_field
 
 class User(AbstractUser):
     """
@@ -36,12 +40,23 @@ class User(AbstractUser):
         verbose_name=('user permissions'),
     )
 
+    class Meta:
+        """
+        Prefix index backing the admin's case-insensitive username search.
+        """
+        indexes = [
+            models.Index(
+                OpClass(Upper('username'), name='text_pattern_ops'),
+                name='user_username_upper_prefix',
+            ),
+        ]
+
 class Account(models.Model):
     """
     Account Model for checking user details
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('1000.00'))
+    balance = money_field(default=Decimal('1000.00'))
 
     def get_balance(self):
         """
@@ -54,14 +69,16 @@ class Account(models.Model):
         Returns a string representation of the account.
         """
         # pylint: disable=no-member
-        return f"Account of {self.user.username} with balance {self.balance}"
+        return f"Account of {self.user.username} with balance {from_storage(self.balance)}"
 
 def clear_transaction_history_cache(user_id):
     """
-    Clears the transaction history cache for a given user.
+    Clears the transaction history cache for a given user on every worker.
+    Deferred until commit so a concurrent rebuild cannot cache rows that
+    are not yet visible.
     """
-    cache_key = f"transaction_history_{user_id}"
-    cache.delete(cache_key)
+    cache_key = history_cache_key(user_id)
+    transaction.on_commit(lambda: history_cache.invalidate(cache_key))
 
 class Transaction(models.Model):
     """
@@ -74,14 +91,22 @@ class Transaction(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = money_field()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        """
+        Index on timestamp for the admin date hierarchy.
+        """
+        indexes = [
+            models.Index(fields=['timestamp'], name='transaction_timestamp_idx'),
+        ]
+
     def __str__(self):
         """
         Returns a string representation of the transaction.
         """
-        return f"{self.transaction_type} of {self.amount}"
+        return f"{self.transaction_type} of {from_storage(self.amount)}"
 
     def save(self, *args, **kwargs):
         """
@@ -93,7 +118,7 @@ class Transaction(models.Model):
 
         super().save(*args, **kwargs)
 
-        balance_change = Decimal(self.amount)
+        balance_change = self.amount
         if self.transaction_type != 'deposit':
             balance_change = -balance_change
         account.balance = F('balance') + balance_change
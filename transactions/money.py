@@ -0,0 +1,182 @@
+"""
+Money representation shared by models, serializers and background jobs.
+
+Amounts are stored either as ``DecimalField(max_digits=10, decimal_places=2)``
+(the default) or, with ``MONEY_MINOR_UNITS = True``, as ``BigIntegerField``
+minor units (cents). Code outside this module works on stored values and
+converts with ``to_storage``/``from_storage`` only where amounts cross the
+API or a configured limit. The JSON representation is the same in both modes.
+
+Switching modes is a data migration, done with ``manage.py
+convert_money_storage``. ``MoneyModelField`` looks the same to the migration
+autodetector in both modes, so makemigrations never generates a casting
+AlterField, and every database connection is refused while the column types
+disagree with the setting.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from rest_framework import serializers
+
+MINOR_UNITS = getattr(settings, 'MONEY_MINOR_UNITS', False)
+DECIMAL_PLACES = 2
+MAX_DIGITS = 10
+# Largest amount that still fits a BigIntegerField in minor units.
+MINOR_UNITS_MAX_DIGITS = 17
+SCALE = 10 ** DECIMAL_PLACES
+CENT = Decimal(1).scaleb(-DECIMAL_PLACES)
+ZERO = 0 if MINOR_UNITS else Decimal('0')
+
+
+def to_minor_units(amount):
+    """
+    Converts a decimal amount (or its string form) to integer minor units.
+    """
+    return int((Decimal(amount) * SCALE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor_units(value):
+    """
+    Converts integer minor units to a decimal amount.
+    """
+    return Decimal(value).scaleb(-DECIMAL_PLACES)
+
+
+def to_storage(amount):
+    """
+    Converts a decimal amount to the stored representation.
+    """
+    if MINOR_UNITS:
+        return to_minor_units(amount)
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def from_storage(value):
+    """
+    Converts a stored value to a decimal amount.
+    """
+    if MINOR_UNITS:
+        return from_minor_units(value)
+    return value
+
+
+def storage_to_minor_units(value):
+    """
+    Converts a stored value to integer minor units.
+    """
+    if MINOR_UNITS:
+        return value
+    return to_minor_units(value)
+
+
+class MoneyModelField(models.BigIntegerField if MINOR_UNITS else models.DecimalField):
+    """
+    Model field for an amount, stored as NUMERIC(10, 2) or BIGINT minor units.
+
+    ``default`` is given as a decimal amount. The deconstructed field is the
+    same in both modes, so migrations do not depend on MONEY_MINOR_UNITS.
+    """
+    def __init__(self, *args, **kwargs):
+        if kwargs.get('default') is not None:
+            kwargs['default'] = to_storage(kwargs['default'])
+        if not MINOR_UNITS:
+            kwargs.setdefault('max_digits', MAX_DIGITS)
+            kwargs.setdefault('decimal_places', DECIMAL_PLACES)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, _, args, kwargs = super().deconstruct()
+        kwargs.pop('max_digits', None)
+        kwargs.pop('decimal_places', None)
+        if kwargs.get('default') is not None:
+            kwargs['default'] = from_storage(kwargs['default'])
+        return name, 'transactions.money.MoneyModelField', args, kwargs
+
+
+def money_field(**kwargs):
+    """
+    Returns the model field used to store an amount.
+    """
+    return MoneyModelField(**kwargs)
+
+
+def money_columns():
+    """
+    Returns ``(table, column)`` for every stored amount.
+    """
+    return [
+        (model._meta.db_table, field.column) # pylint: disable=protected-access
+        for model in apps.get_app_config('transactions').get_models()
+        for field in model._meta.concrete_fields # pylint: disable=protected-access
+        if isinstance(field, MoneyModelField)
+    ]
+
+
+def money_column_types(connection):
+    """
+    Returns the PostgreSQL data type of each existing money column, keyed by
+    ``(table, column)``.
+    """
+    columns = money_columns()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND (table_name, column_name) IN ("
+            + ", ".join(["(%s, %s)"] * len(columns)) + ")",
+            [value for column in columns for value in column],
+        )
+        return {(table, column): data_type for table, column, data_type in cursor.fetchall()}
+
+
+_checked_connections = set()
+
+
+def check_storage_columns(sender, connection, **kwargs): # pylint: disable=unused-argument
+    """
+    ``connection_created`` receiver that refuses to use a database whose money
+    columns do not match MONEY_MINOR_UNITS. Checks each alias once per process.
+    """
+    if connection.vendor != 'postgresql' or connection.alias in _checked_connections:
+        return
+    expected = 'bigint' if MINOR_UNITS else 'numeric'
+    mismatched = [
+        f"{table}.{column} is {data_type}"
+        for (table, column), data_type in money_column_types(connection).items()
+        if data_type != expected
+    ]
+    if mismatched:
+        raise ImproperlyConfigured(
+            f"MONEY_MINOR_UNITS is {MINOR_UNITS} but {', '.join(mismatched)}. Run "
+            f"`manage.py convert_money_storage {'minor' if MINOR_UNITS else 'decimal'}` "
+            "or change the setting back."
+        )
+    _checked_connections.add(connection.alias)
+
+
+def money_output_field():
+    """
+    Returns the output field for sums of stored amounts.
+    """
+    if MINOR_UNITS:
+        return models.BigIntegerField()
+    return models.DecimalField(max_digits=20, decimal_places=DECIMAL_PLACES)
+
+
+class MoneyField(serializers.DecimalField):
+    """
+    Serializer field that reads and writes decimal amounts in the API and
+    converts them to and from the stored representation.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_digits', MINOR_UNITS_MAX_DIGITS if MINOR_UNITS else MAX_DIGITS)
+        kwargs.setdefault('decimal_places', DECIMAL_PLACES)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return to_storage(super().to_internal_value(data))
+
+    def to_representation(self, value):
+        return super().to_representation(from_storage(value))
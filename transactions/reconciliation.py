@@ -0,0 +1,162 @@
+"""
+Ledger reconciliation: checks that every account balance equals its opening
+balance plus deposits minus withdrawals.
+
+The user-id space is split into ranges. Each range is checked with one
+grouped aggregate over transactions and one read of account balances, both
+inside a read-only snapshot so no row locks are taken. Repairs lock a single
+account at a time and recompute its ledger under that lock.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import Case, F, Max, Min, Sum, When
+from django.utils import timezone
+
+from .conf import get_option
+from .models import Account, Transaction
+from .money import ZERO, from_storage, money_output_field, to_storage
+
+def opening_balance():
+    """
+    Returns the balance every account is created with.
+    """
+    return Account._meta.get_field('balance').default # pylint: disable=no-member,protected-access
+
+
+def net_amount():
+    """
+    Returns an aggregate of deposits minus withdrawals.
+    """
+    return Sum(
+        Case(
+            When(transaction_type='deposit', then=F('amount')),
+            default=-F('amount'),
+        ),
+        output_field=money_output_field(),
+    )
+
+
+def user_id_ranges(chunk_size):
+    """
+    Splits the account user-id space into half-open ``(start, end)`` ranges.
+    """
+    bounds = Account.objects.aggregate(low=Min('user_id'), high=Max('user_id')) # pylint: disable=no-member
+    if bounds['low'] is None:
+        return []
+    return [
+        (start, min(start + chunk_size, bounds['high'] + 1))
+        for start in range(bounds['low'], bounds['high'] + 1, chunk_size)
+    ]
+
+
+def _use_snapshot():
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+
+
+def reconcile_range(start, end, repair=False):
+    """
+    Compares balances with ledger sums for users in ``[start, end)``.
+
+    Returns a JSON-serializable dict with the number of accounts checked and
+    the list of discrepancies found.
+    """
+    with transaction.atomic():
+        _use_snapshot()
+        ledger = dict(
+            Transaction.objects # pylint: disable=no-member
+            .filter(user_id__gte=start, user_id__lt=end)
+            .values('user_id')
+            .annotate(net=net_amount())
+            .values_list('user_id', 'net')
+        )
+        balances = list(
+            Account.objects # pylint: disable=no-member
+            .filter(user_id__gte=start, user_id__lt=end)
+            .values_list('user_id', 'balance')
+        )
+
+    opening = opening_balance()
+    discrepancies = []
+    for user_id, balance in balances:
+        expected = opening + ledger.get(user_id, ZERO)
+        if balance != expected:
+            discrepancies.append({
+                'user_id': user_id,
+                'balance': str(from_storage(balance)),
+                'expected': str(from_storage(expected)),
+                'difference': str(from_storage(balance - expected)),
+                'repaired': repair and repair_account(user_id),
+            })
+
+    return {'start': start, 'end': end, 'accounts': len(balances), 'discrepancies': discrepancies}
+
+
+def repair_account(user_id):
+    """
+    Sets an account balance to its ledger value. Returns True if it changed.
+    """
+    with transaction.atomic():
+        account = Account.objects.select_for_update().get(user_id=user_id) # pylint: disable=no-member
+        net = Transaction.objects.filter(user_id=user_id).aggregate(net=net_amount())['net'] # pylint: disable=no-member
+        expected = opening_balance() + (net or ZERO)
+        if account.balance == expected:
+            return False
+        Account.objects.filter(pk=account.pk).update(balance=expected) # pylint: disable=no-member
+        return True
+
+
+def _reconcile_range_in_thread(bounds, repair):
+    try:
+        return reconcile_range(*bounds, repair=repair)
+    finally:
+        connection.close()
+
+
+def run_reconciliation(chunk_size=None, workers=None, repair=False):
+    """
+    Reconciles every account using a local thread pool and returns the report.
+    """
+    chunk_size = chunk_size or get_option('LEDGER_RECONCILIATION', 'CHUNK_SIZE')
+    workers = workers or get_option('LEDGER_RECONCILIATION', 'WORKERS')
+    ranges = user_id_ranges(chunk_size)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda bounds: _reconcile_range_in_thread(bounds, repair), ranges))
+    return build_report(results, repair)
+
+
+def build_report(results, repair=False):
+    """
+    Combines per-range results into a single report.
+    """
+    discrepancies = [item for result in results for item in result['discrepancies']]
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'repair': repair,
+        'ranges': len(results),
+        'accounts': sum(result['accounts'] for result in results),
+        'mismatched': len(discrepancies),
+        'repaired': sum(1 for item in discrepancies if item['repaired']),
+        'total_difference': str(from_storage(
+            sum((to_storage(item['difference']) for item in discrepancies), ZERO)
+        )),
+        'discrepancies': discrepancies,
+    }
+
+
+def write_report(report, path=None):
+    """
+    Writes the report as compact JSON and returns the file path.
+    """
+    if path is None:
+        report_dir = get_option('LEDGER_RECONCILIATION', 'REPORT_DIR')
+        os.makedirs(report_dir, exist_ok=True)
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+        path = os.path.join(report_dir, f"reconciliation_{stamp}.json")
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, separators=(',', ':'))
+    return path
@@ -5,6 +5,7 @@ Serializers for the transaction simulation application.
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from .models import User, Account, Transaction
+from .money import MoneyField
 
 class UserSerializer(serializers.ModelSerializer):
     """
@@ -84,6 +85,8 @@ class AccountSerializer(serializers.ModelSerializer):
     Serializer for the Account model, responsible for serializing 
     the account data including the associated user and balance.
     """
+    balance = MoneyField(read_only=True)
+
     class Meta:
         """
         The serialized fields include:
@@ -100,6 +103,8 @@ class TransactionSerializer(serializers.ModelSerializer):
     transaction data, including transaction type, amount, and timestamp.
     It also validates that the transaction amount is greater than zero.
     """
+    amount = MoneyField()
+
     class Meta:
         """
         Meta class for defining the model and fields that are serialized by the AccountSerializer.
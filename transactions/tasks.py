@@ -1,30 +1,120 @@
 # transactions/tasks.py
-from celery import shared_task
+from celery import chord, shared_task
 from django.db import transaction
-from django.db.models import F
 from django.core.exceptions import ValidationError
+from .cache import history_cache, history_cache_key
+from .conf import get_option
+from .events import publish_transaction_events, publish_transaction_failed
 from .models import Transaction, Account
+from .money import to_storage
+from .reconciliation import (
+    build_report,
+    reconcile_range,
+    user_id_ranges,
+    write_report
+)
+from .serializers import TransactionSerializer
+from .tokens import backfill_blacklisted_tokens, purge_expired_tokens
+from .velocity import reconcile_counters, release
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-@shared_task(bind=True)
-def process_transaction(self, user_id, amount, transaction_type, transaction_data):
-    """Simulates processing a transaction for a user."""
+@shared_task(bind=True, max_retries=3)
+def process_transaction(self, user_id, amount, transaction_type, transaction_data, bucket=None):
+    """
+    Settles a transaction accepted by the API: records it and moves the balance.
+
+    ``amount`` is the decimal amount as a string. Saving the Transaction
+    applies the balance change, so this is the only place either happens.
+    ``bucket`` is where the view reserved the velocity counters; if the
+    transaction is rejected or keeps failing, that reservation is released and
+    a ``transaction_failed`` event is published.
+    """
+    amount = to_storage(amount)
     try:
         user = User.objects.get(id=user_id)
         with transaction.atomic():
             account = Account.objects.select_for_update().get(user=user)
 
-            if transaction_type == 'withdrawal':
-                if account.balance < amount:
-                    raise ValidationError("Insufficient balance for withdrawal.")
-                account.balance = F('balance') - amount
-            else:
-                account.balance = F('balance') + amount
-            account.save()
+            if transaction_type == 'withdrawal' and account.balance < amount:
+                raise ValidationError("Insufficient balance for withdrawal.")
 
-            Transaction.objects.create(user=user, amount=amount, transaction_type=transaction_type, **transaction_data)
+            instance = Transaction.objects.create(user=user, amount=amount, transaction_type=transaction_type, **transaction_data)
+            # Clients only hear about a transaction once it has settled.
+            transaction.on_commit(lambda: publish_transaction_events(instance), robust=True)
         return "Transaction successful"
+    except ValidationError as e:
+        # Retrying cannot change the outcome.
+        reject_transaction(user_id, transaction_type, amount, bucket, e.messages[0])
+        return "Transaction rejected"
     except Exception as e:
-        raise self.retry(exc=e, countdown=10, max_retries=3)
+        if self.request.retries >= self.max_retries:
+            reject_transaction(
+                user_id, transaction_type, amount, bucket, "Transaction could not be processed."
+            )
+            raise
+        raise self.retry(exc=e, countdown=10)
+
+
+def reject_transaction(user_id, transaction_type, amount, bucket, detail):
+    """Releases a failed transaction's velocity reservation and notifies the client."""
+    if bucket is not None:
+        release(user_id, transaction_type, amount, bucket)
+    publish_transaction_failed(user_id, transaction_type, amount, detail)
+
+
+def build_transaction_history(user_id):
+    """Serializes a user's full transaction history for caching."""
+    queryset = Transaction.objects.filter(user_id=user_id)
+    return list(TransactionSerializer(queryset, many=True).data)
+
+
+@shared_task
+def refresh_transaction_history_cache(user_id, lock_token):
+    """Rebuilds a stale transaction history entry and releases its rebuild lock."""
+    cache_key = history_cache_key(user_id)
+    try:
+        generation = history_cache.generation(cache_key)
+        history_cache.set(cache_key, build_transaction_history(user_id), generation)
+    finally:
+        history_cache.release_lock(cache_key, lock_token)
+
+
+@shared_task
+def reconcile_ledger_range(start, end, repair=False):
+    """Reconciles account balances for users in ``[start, end)``."""
+    return reconcile_range(start, end, repair=repair)
+
+
+@shared_task
+def write_reconciliation_report(results, repair=False, path=None):
+    """Combines range results into a report file and returns its summary."""
+    report = build_report(results, repair)
+    path = write_report(report, path)
+    return {k: v for k, v in report.items() if k != 'discrepancies'} | {'path': path}
+
+
+@shared_task
+def reconcile_ledger(chunk_size=None, repair=False, path=None):
+    """Fans reconciliation out over user-id ranges across the Celery workers."""
+    ranges = user_id_ranges(chunk_size or get_option('LEDGER_RECONCILIATION', 'CHUNK_SIZE'))
+    callback = write_reconciliation_report.s(repair=repair, path=path)
+    if not ranges:
+        return callback.delay([]).id
+    return chord(
+        reconcile_ledger_range.s(start, end, repair) for start, end in ranges
+    )(callback).id
+
+
+@shared_task
+def reconcile_velocity_counters():
+    """Rebuilds the velocity-limit rolling counters from the transactions table."""
+    return reconcile_counters()
+
+
+@shared_task
+def purge_token_blacklist():
+    """Copies blacklisted-token rows into Redis and deletes expired ones from the simplejwt tables."""
+    backfill_blacklisted_tokens()
+    return purge_expired_tokens()
@@ -0,0 +1,265 @@
+"""
+Tests for the transactions app.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+import fakeredis
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .cache import TwoTierCache
+from .events import EventBroker, stream_events
+from .models import Transaction, User
+from .pagination import BoundedDateQuerySet
+from . import velocity
+from .serializers import TransactionSerializer
+from .views import TransactionHistoryView
+
+
+class TransactionHistoryRoundTripTests(SimpleTestCase):
+    """
+    Amounts read back from the transaction history, cached or not, match what
+    was submitted in both money storage modes.
+    """
+    def setUp(self):
+        self.user = User(id=1, username='paul')
+        self.cache = {}
+
+    def get_or_set(self, key, loader, refresh=None):
+        if key not in self.cache:
+            self.cache[key] = loader()
+        return self.cache[key]
+
+    def submit(self, amount):
+        serializer = TransactionSerializer(data={'transaction_type': 'deposit', 'amount': amount})
+        serializer.is_valid(raise_exception=True)
+        return Transaction(
+            id=1, user=self.user, timestamp=timezone.now(), **serializer.validated_data
+        )
+
+    def get_history(self):
+        request = APIRequestFactory().get('/api/transactions/')
+        force_authenticate(request, user=self.user)
+        response = TransactionHistoryView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return [item['amount'] for item in response.data['results']]
+
+    def assert_round_trip(self, minor_units, stored):
+        with mock.patch('transactions.money.MINOR_UNITS', minor_units):
+            instance = self.submit('100.50')
+            self.assertEqual(instance.amount, stored)
+            with mock.patch.object(Transaction.objects, 'filter', return_value=[instance]), \
+                    mock.patch('transactions.views.history_cache.get_or_set', self.get_or_set):
+                # The first request builds the cache entry, the second reads it.
+                self.assertEqual(self.get_history(), ['100.50'])
+                self.assertEqual(self.get_history(), ['100.50'])
+
+    def test_decimal_storage(self):
+        self.assert_round_trip(False, Decimal('100.50'))
+
+    def test_minor_unit_storage(self):
+        self.assert_round_trip(True, 10050)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'history': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'history'},
+})
+class TwoTierCacheTests(SimpleTestCase):
+    """
+    Single-flight rebuilds and invalidation of the two-tier history cache.
+    """
+    def setUp(self):
+        patches = [
+            mock.patch.object(TwoTierCache, '_ensure_listener'),
+            mock.patch('transactions.cache.get_redis_connection'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.cache = TwoTierCache({'ALIAS': 'history', 'LOCK_TIMEOUT': 5, 'LOCK_WAIT': 0.01})
+        self.cache.shared.clear()
+
+    def test_invalidation_during_rebuild_hands_off_to_one_waiter(self):
+        calls = []
+        building = threading.Event()
+
+        def loader():
+            calls.append(None)
+            build = len(calls)
+            if build == 1:
+                building.set()
+                time.sleep(0.3)
+            return build
+
+        results = []
+        readers = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_set('key', loader)))
+            for _ in range(8)
+        ]
+        started = time.monotonic()
+        for reader in readers:
+            reader.start()
+        building.wait()
+        # Let the other readers reach the wait loop, then land a write.
+        time.sleep(0.1)
+        self.cache.invalidate('key')
+        for reader in readers:
+            reader.join()
+
+        self.assertEqual(len(calls), 2)
+        self.assertLess(time.monotonic() - started, 2)
+        # Only the first builder, which loaded before the invalidation, saw 1.
+        self.assertEqual(sorted(results), [1] + [2] * 7)
+        self.assertEqual(self.cache.get_or_set('key', loader), 2)
+
+    def test_stale_local_copy_is_replaced_from_shared_before_refreshing(self):
+        self.cache.set('key', 'old')
+        self.cache.local.set('key', {**self.cache.local.get('key'), 'fresh_until': 0})
+        self.cache.shared.set('key', {'data': 'new', 'fresh_until': time.time() + 60, 'generation': 0})
+        refresh = mock.Mock()
+
+        self.assertEqual(self.cache.get_or_set('key', mock.Mock(), refresh=refresh), 'new')
+        refresh.assert_not_called()
+        self.assertEqual(self.cache.local.get('key')['data'], 'new')
+
+
+@override_settings(ACCOUNT_EVENTS={'HEARTBEAT': 0.05, 'RETRY': 3000})
+class AccountEventStreamTests(SimpleTestCase):
+    """
+    Account event streams end when the token they were opened with expires.
+    """
+    def setUp(self):
+        patch = mock.patch.object(EventBroker, '_ensure_listener')
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def collect(self, expires_at):
+        async def consume():
+            return [chunk async for chunk in stream_events(1, expires_at=expires_at)]
+        return asyncio.run(asyncio.wait_for(consume(), timeout=2))
+
+    def test_stream_closes_at_expiry(self):
+        chunks = self.collect(time.time() + 0.12)
+        self.assertEqual(chunks[0], 'retry: 3000\n\n')
+        self.assertEqual(set(chunks[1:]), {': heartbeat\n\n'})
+
+    def test_expired_token_gets_no_events(self):
+        self.assertEqual(self.collect(time.time() - 1), ['retry: 3000\n\n'])
+
+
+@override_settings(VELOCITY_LIMITS={
+    'BUCKET_SECONDS': 60,
+    'RULES': {
+        'withdrawal': [{'window': 60 * 60, 'max_count': 3, 'max_amount': '100.00'}],
+    },
+})
+class VelocityLimitTests(SimpleTestCase):
+    """
+    Velocity counters against an in-memory Redis that runs the Lua scripts.
+    """
+    now = 1_800_000_000
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        patches = [
+            mock.patch('transactions.velocity._redis', return_value=self.redis),
+            mock.patch.dict(velocity._scripts, clear=True), # pylint: disable=protected-access
+            mock.patch('transactions.velocity.time.time', return_value=self.now),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.bucket = self.now // 60
+        self.key = velocity.counter_key(1, 'withdrawal', 60 * 60)
+
+    def counters(self, key=None):
+        return {
+            field.decode(): int(value)
+            for field, value in self.redis.hgetall(key or self.key).items()
+        }
+
+    def test_count_limit(self):
+        for _ in range(3):
+            velocity.check_and_record(1, 'withdrawal', Decimal('1.00'))
+        with self.assertRaises(velocity.VelocityLimitExceeded):
+            velocity.check_and_record(1, 'withdrawal', Decimal('1.00'))
+        self.assertEqual(self.counters()[f"c:{self.bucket}"], 3)
+
+    def test_amount_limit(self):
+        velocity.check_and_record(1, 'withdrawal', Decimal('60.00'))
+        with self.assertRaises(velocity.VelocityLimitExceeded):
+            velocity.check_and_record(1, 'withdrawal', Decimal('40.01'))
+        velocity.check_and_record(1, 'withdrawal', Decimal('40.00'))
+        self.assertEqual(self.counters()[f"a:{self.bucket}"], 10000)
+
+    def test_other_types_and_expired_buckets_are_not_counted(self):
+        velocity.check_and_record(1, 'deposit', Decimal('500.00'))
+        self.redis.hset(self.key, mapping={f"c:{self.bucket - 60}": 3, f"a:{self.bucket - 60}": 9000})
+        velocity.check_and_record(1, 'withdrawal', Decimal('100.00'))
+        self.assertNotIn(f"c:{self.bucket - 60}", self.counters())
+
+    def test_release(self):
+        bucket = velocity.check_and_record(1, 'withdrawal', Decimal('100.00'))
+        velocity.release(1, 'withdrawal', Decimal('100.00'), bucket)
+        self.assertEqual(self.counters(), {f"c:{bucket}": 0, f"a:{bucket}": 0})
+        velocity.check_and_record(1, 'withdrawal', Decimal('100.00'))
+
+    def test_reconcile_replaces_closed_buckets_and_keeps_open_ones(self):
+        closed = self.bucket - 10
+        # Live reservation for a transaction that has not settled yet.
+        velocity.check_and_record(1, 'withdrawal', Decimal('25.00'))
+        # Drifted counts for a closed bucket, and a counter with no transactions.
+        self.redis.hset(self.key, mapping={f"c:{closed}": 5, f"a:{closed}": 9000})
+        orphan = velocity.counter_key(2, 'withdrawal', 60 * 60)
+        self.redis.hset(orphan, mapping={f"c:{closed}": 1, f"a:{closed}": 100})
+
+        settled_at = datetime.fromtimestamp(closed * 60 + 5, tz=dt_timezone.utc)
+        rows = [(1, 'withdrawal', Decimal('10.00'), settled_at)]
+        with mock.patch.object(Transaction.objects, 'filter') as query:
+            query.return_value.values_list.return_value.iterator.return_value = rows
+            self.assertEqual(velocity.reconcile_counters(), 2)
+
+        # Only buckets before the newest OPEN_BUCKETS are read from the table.
+        closed_before = query.call_args.kwargs['timestamp__lt']
+        self.assertEqual(closed_before.timestamp(), (self.bucket - velocity.OPEN_BUCKETS + 1) * 60)
+        self.assertEqual(self.counters(), {
+            f"c:{closed}": 1, f"a:{closed}": 1000,
+            f"c:{self.bucket}": 1, f"a:{self.bucket}": 2500,
+        })
+        self.assertFalse(self.redis.exists(orphan))
+        self.assertEqual(self.redis.ttl(self.key), 60 * 60 + 60)
+
+
+@override_settings(USE_TZ=True, TIME_ZONE='UTC')
+class BoundedDateQuerySetTests(SimpleTestCase):
+    """
+    Date hierarchy choices are built from the field's bounds.
+    """
+    def datetimes(self, first, last, kind, order='ASC'):
+        queryset = BoundedDateQuerySet(model=Transaction)
+        bounds = {'first': first, 'last': last}
+        with mock.patch.object(BoundedDateQuerySet, 'aggregate', return_value=bounds):
+            return [value.date().isoformat() for value in queryset.datetimes('timestamp', kind, order)]
+
+    def test_periods_between_bounds(self):
+        first = datetime(2024, 11, 30, 23, 0, tzinfo=dt_timezone.utc)
+        last = datetime(2025, 2, 2, 1, 0, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.datetimes(first, last, 'year'), ['2024-01-01', '2025-01-01'])
+        self.assertEqual(
+            self.datetimes(first, last, 'month'),
+            ['2024-11-01', '2024-12-01', '2025-01-01', '2025-02-01'],
+        )
+        self.assertEqual(
+            self.datetimes(last.replace(day=1), last, 'day', order='DESC'),
+            ['2025-02-02', '2025-02-01'],
+        )
+
+    def test_empty_table(self):
+        self.assertEqual(self.datetimes(None, None, 'year'), [])
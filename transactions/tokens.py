@@ -0,0 +1,273 @@
+"""
+JWT blacklist kept in Redis instead of the simplejwt token_blacklist tables.
+
+Revoked JTIs are stored as Redis keys that expire with the token, so the
+blacklist never grows past the set of revoked, still-valid tokens, and no
+outstanding-token rows are written. An optional in-process Bloom filter,
+kept in sync over pub/sub, answers the common "not revoked" case without a
+Redis round trip.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenBlacklistSerializer,
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+    TokenVerifySerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken, UntypedToken
+
+from .conf import get_option
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+    """
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        """
+        Adds a value to the filter.
+        """
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(value))
+
+
+class RedisTokenBlacklist:
+    """
+    Revoked-JTI store with an optional per-process Bloom filter in front.
+
+    The filter is only consulted once this process is subscribed to the
+    revocation channel and has loaded the current blacklist; until then, and
+    after any listener failure, every check goes to Redis. It is rebuilt every
+    REFRESH_TOKEN_LIFETIME so expired JTIs fall out of it.
+    """
+    def __init__(self):
+        self._bloom = None
+        self._building = None
+        self._ready = False
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        """
+        Returns the raw Redis client.
+        """
+        return get_redis_connection(get_option('JWT_BLACKLIST', 'ALIAS'))
+
+    def key(self, jti):
+        """
+        Returns the Redis key marking a JTI as revoked.
+        """
+        return f"{get_option('JWT_BLACKLIST', 'KEY_PREFIX')}:{jti}"
+
+    def revoke(self, jti, exp):
+        """
+        Blacklists a JTI until its token expires at ``exp`` (epoch seconds).
+        """
+        self.revoke_many([(jti, exp)])
+
+    def revoke_many(self, tokens):
+        """
+        Blacklists ``(jti, exp)`` pairs in one round trip. Returns how many
+        were still unexpired and got revoked.
+        """
+        now = time.time()
+        pipe = self.redis.pipeline()
+        revoked = []
+        for jti, exp in tokens:
+            ttl = int(exp - now)
+            if ttl <= 0:
+                continue
+            pipe.set(self.key(jti), 1, ex=ttl)
+            pipe.publish(get_option('JWT_BLACKLIST', 'CHANNEL'), jti)
+            revoked.append(jti)
+        if revoked:
+            pipe.execute()
+        for jti in revoked:
+            self._add(jti)
+        return len(revoked)
+
+    def is_revoked(self, jti):
+        """
+        Returns True if the JTI has been blacklisted.
+        """
+        if get_option('JWT_BLACKLIST', 'BLOOM_FILTER'):
+            self._ensure_listener()
+            if self._ready and jti not in self._bloom:
+                return False
+        return bool(self.redis.exists(self.key(jti)))
+
+    def _add(self, jti):
+        with self._lock:
+            for bloom in (self._bloom, self._building):
+                if bloom is not None:
+                    bloom.add(jti)
+
+    def _rebuild(self):
+        with self._lock:
+            self._building = BloomFilter(
+                get_option('JWT_BLACKLIST', 'BLOOM_CAPACITY'), get_option('JWT_BLACKLIST', 'BLOOM_ERROR_RATE')
+            )
+        prefix_length = len(get_option('JWT_BLACKLIST', 'KEY_PREFIX')) + 1
+        for key in self.redis.scan_iter(match=self.key('*'), count=1000):
+            key = key.decode() if isinstance(key, bytes) else key
+            self._add(key[prefix_length:])
+        with self._lock:
+            self._bloom, self._building = self._building, None
+            self._ready = True
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._ready = False
+            threading.Thread(target=self._listen, name='jwt-blacklist', daemon=True).start()
+            self._pid = pid
+
+    def _listen(self):
+        rebuild_every = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(get_option('JWT_BLACKLIST', 'CHANNEL'))
+                self._rebuild()
+                rebuilt_at = time.monotonic()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        jti = message['data']
+                        self._add(jti.decode() if isinstance(jti, bytes) else jti)
+                    if time.monotonic() - rebuilt_at > rebuild_every:
+                        self._rebuild()
+                        rebuilt_at = time.monotonic()
+            except Exception: # pylint: disable=broad-except
+                logger.exception("JWT blacklist listener failed, reconnecting")
+                self._ready = False
+                time.sleep(1)
+
+
+token_blacklist = RedisTokenBlacklist()
+
+
+class RedisRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist lives in Redis. Issuing it does not write an
+    OutstandingToken row and checking it does not query the database.
+    """
+    def check_blacklist(self):
+        """
+        Raises TokenError if this token has been revoked.
+        """
+        if token_blacklist.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        """
+        Revokes this token until it expires.
+        """
+        token_blacklist.revoke(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Issues a token for the user without outstanding-token bookkeeping.
+        """
+        return super(BlacklistMixin, cls).for_user(user)
+
+
+class RedisTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Token pair serializer that issues Redis-blacklisted refresh tokens.
+    """
+    token_class = RedisRefreshToken
+
+
+class RedisTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh serializer that checks the Redis blacklist.
+    """
+    token_class = RedisRefreshToken
+
+
+class RedisTokenBlacklistSerializer(TokenBlacklistSerializer):
+    """
+    Blacklist (logout) serializer that revokes tokens in Redis.
+    """
+    token_class = RedisRefreshToken
+
+
+class RedisTokenVerifySerializer(TokenVerifySerializer):
+    """
+    Verify serializer that checks the Redis blacklist instead of the database.
+    """
+    def validate(self, attrs):
+        """
+        Validates the token signature and expiry and rejects revoked tokens.
+        """
+        token = UntypedToken(attrs['token'])
+        jti = token.get(api_settings.JTI_CLAIM)
+        if jti and token_blacklist.is_revoked(jti):
+            raise serializers.ValidationError("Token is blacklisted")
+        return {}
+
+
+def backfill_blacklisted_tokens(batch_size=1000):
+    """
+    Copies unexpired BlacklistedToken rows into the Redis blacklist, so tokens
+    revoked before it existed (or through the admin) stay revoked.
+    Returns the number of tokens copied.
+    """
+    rows = (
+        BlacklistedToken.objects
+        .filter(token__expires_at__gt=timezone.now())
+        .values_list('token__jti', 'token__expires_at')
+        .iterator(chunk_size=batch_size)
+    )
+    copied = 0
+    batch = []
+    for jti, expires_at in rows:
+        batch.append((jti, expires_at.timestamp()))
+        if len(batch) >= batch_size:
+            copied += token_blacklist.revoke_many(batch)
+            batch = []
+    return copied + token_blacklist.revoke_many(batch)
+
+
+def purge_expired_tokens():
+    """
+    Deletes expired outstanding tokens and, by cascade, their blacklist rows.
+    Returns the number of rows deleted.
+    """
+    deleted, _ = OutstandingToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
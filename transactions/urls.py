@@ -1,6 +1,7 @@
 """
 This module contains URL patterns for user registration, login,
-account management, transaction management, and transaction history views.
+account management, transaction management, transaction history and
+account event stream views.
 """
 from django.urls import path
 from .views import (
@@ -8,7 +9,8 @@ from .views import (
     UserLoginView,
     AccountView,
     TransactionView,
-    TransactionHistoryView
+    TransactionHistoryView,
+    AccountEventStreamView
 )
 
 urlpatterns = [
@@ -17,4 +19,5 @@ urlpatterns = [
     path('account/', AccountView.as_view(), name='account'),
     path('transaction/', TransactionView.as_view(), name='transaction'),
     path('transactions/', TransactionHistoryView.as_view(), name='transaction_history'),
+    path('events/', AccountEventStreamView.as_view(), name='account_events'),
 ]
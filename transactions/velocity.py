@@ -0,0 +1,248 @@
+"""
+Per-account velocity limits backed by Redis rolling counters.
+
+Each rule (for example "at most 10 withdrawals or 5000.00 per hour") is kept
+in one Redis hash of per-bucket counts and minor-unit totals. A Lua script
+prunes expired buckets, checks every rule for the transaction type and
+records the transaction in a single round trip, so the cost of a check does
+not depend on how many transactions the account has made.
+"""
+import logging
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django_redis import get_redis_connection
+
+from .conf import get_option
+from .money import storage_to_minor_units, to_minor_units
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'velocity'
+
+# KEYS: one hash per rule. ARGV[1]: current bucket, ARGV[2]: amount in minor
+# units, then four values per rule: buckets in window, max count, max amount
+# (-1 for no limit) and key TTL. Returns 0 on success or the 1-based index of
+# the first rule that would be exceeded, in which case nothing is recorded.
+CHECK_AND_RECORD_SCRIPT = """
+local bucket = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+for i, key in ipairs(KEYS) do
+    local base = 2 + (i - 1) * 4
+    local oldest = bucket - tonumber(ARGV[base + 1]) + 1
+    local max_count = tonumber(ARGV[base + 2])
+    local max_amount = tonumber(ARGV[base + 3])
+    local fields = redis.call('HGETALL', key)
+    local count, total = 0, 0
+    for j = 1, #fields, 2 do
+        local field = fields[j]
+        if tonumber(string.sub(field, 3)) < oldest then
+            redis.call('HDEL', key, field)
+        elseif string.sub(field, 1, 1) == 'c' then
+            count = count + tonumber(fields[j + 1])
+        else
+            total = total + tonumber(fields[j + 1])
+        end
+    end
+    if (max_count >= 0 and count + 1 > max_count)
+            or (max_amount >= 0 and total + amount > max_amount) then
+        return i
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HINCRBY', key, 'c:' .. bucket, 1)
+    redis.call('HINCRBY', key, 'a:' .. bucket, amount)
+    redis.call('EXPIRE', key, ARGV[2 + (i - 1) * 4 + 4])
+end
+return 0
+"""
+
+# KEYS[1]: one rule's hash. ARGV[1]: first bucket that is still open, ARGV[2]:
+# key TTL, then field/value pairs rebuilt for closed buckets. Closed buckets
+# are replaced with the rebuilt values; open ones keep their live counts,
+# including reservations for transactions that have not settled yet.
+MERGE_CLOSED_BUCKETS_SCRIPT = """
+local open_from = tonumber(ARGV[1])
+for _, field in ipairs(redis.call('HKEYS', KEYS[1])) do
+    if tonumber(string.sub(field, 3)) < open_from then
+        redis.call('HDEL', KEYS[1], field)
+    end
+end
+for i = 3, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+if redis.call('HLEN', KEYS[1]) == 0 then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Buckets younger than this are left to check_and_record: transactions
+# admitted in them may still be waiting for process_transaction to settle.
+OPEN_BUCKETS = 2
+
+
+class VelocityLimitExceeded(Exception):
+    """
+    Raised when a transaction would exceed one of its velocity rules.
+    """
+    def __init__(self, transaction_type, rule):
+        self.transaction_type = transaction_type
+        self.rule = rule
+        limits = []
+        if rule.get('max_count') is not None:
+            limits.append(f"{rule['max_count']} transactions")
+        if rule.get('max_amount') is not None:
+            limits.append(f"{rule['max_amount']} in total")
+        super().__init__(
+            f"Velocity limit exceeded: at most {' or '.join(limits)} "
+            f"per {rule['window']} seconds for {transaction_type}."
+        )
+
+
+def counter_key(user_id, transaction_type, window):
+    """
+    Returns the Redis hash holding a rule's rolling counters.
+    """
+    return f"{KEY_PREFIX}:{user_id}:{transaction_type}:{window}"
+
+
+def window_buckets(window):
+    """
+    Returns how many buckets a rule window spans.
+    """
+    return math.ceil(window / get_option('VELOCITY_LIMITS', 'BUCKET_SECONDS'))
+
+
+def _redis():
+    return get_redis_connection(get_option('VELOCITY_LIMITS', 'ALIAS'))
+
+
+_scripts = {}
+
+
+def _script(source):
+    key = (get_option('VELOCITY_LIMITS', 'ALIAS'), source)
+    if key not in _scripts:
+        _scripts[key] = _redis().register_script(source)
+    return _scripts[key]
+
+
+def _check_and_record_script():
+    return _script(CHECK_AND_RECORD_SCRIPT)
+
+
+def check_and_record(user_id, transaction_type, amount):
+    """
+    Atomically checks the rules for ``transaction_type`` and records the
+    transaction. Returns the bucket it was recorded in, for ``release``.
+
+    Raises:
+        VelocityLimitExceeded: If any rule would be exceeded.
+    """
+    rules = get_option('VELOCITY_LIMITS', 'RULES').get(transaction_type, [])
+    bucket_seconds = get_option('VELOCITY_LIMITS', 'BUCKET_SECONDS')
+    bucket = int(time.time()) // bucket_seconds
+    if not rules:
+        return bucket
+
+    keys = []
+    args = [bucket, storage_to_minor_units(amount)]
+    for rule in rules:
+        keys.append(counter_key(user_id, transaction_type, rule['window']))
+        max_amount = rule.get('max_amount')
+        args += [
+            window_buckets(rule['window']),
+            -1 if rule.get('max_count') is None else rule['max_count'],
+            -1 if max_amount is None else to_minor_units(max_amount),
+            rule['window'] + bucket_seconds,
+        ]
+
+    violated = _check_and_record_script()(keys=keys, args=args)
+    if violated:
+        raise VelocityLimitExceeded(transaction_type, rules[violated - 1])
+    return bucket
+
+
+def release(user_id, transaction_type, amount, bucket):
+    """
+    Takes back a transaction recorded by ``check_and_record`` that was not saved.
+    """
+    rules = get_option('VELOCITY_LIMITS', 'RULES').get(transaction_type, [])
+    if not rules:
+        return
+    pipe = _redis().pipeline()
+    for rule in rules:
+        key = counter_key(user_id, transaction_type, rule['window'])
+        pipe.hincrby(key, f"c:{bucket}", -1)
+        pipe.hincrby(key, f"a:{bucket}", -storage_to_minor_units(amount))
+    pipe.execute()
+
+
+def reconcile_counters():
+    """
+    Rebuilds the closed buckets of every rolling counter from the transactions
+    table, which holds exactly one row per settled transaction.
+
+    The newest OPEN_BUCKETS buckets are left untouched, and each counter is
+    merged in its own Lua call, so concurrent ``check_and_record`` calls are
+    never lost. Counters for accounts with no transactions in their window
+    keep only their open buckets. Returns the number of counters merged.
+    """
+    from .models import Transaction # pylint: disable=import-outside-toplevel
+
+    rules = get_option('VELOCITY_LIMITS', 'RULES')
+    windows = [rule['window'] for type_rules in rules.values() for rule in type_rules]
+    if not windows:
+        return 0
+
+    bucket_seconds = get_option('VELOCITY_LIMITS', 'BUCKET_SECONDS')
+    now_bucket = int(time.time()) // bucket_seconds
+    open_from = now_bucket - OPEN_BUCKETS + 1
+    closed_before = datetime.fromtimestamp(open_from * bucket_seconds, tz=dt_timezone.utc)
+    since = closed_before - timedelta(seconds=max(windows) + bucket_seconds)
+
+    buckets = defaultdict(lambda: [0, 0])
+    rows = (
+        Transaction.objects # pylint: disable=no-member
+        .filter(
+            timestamp__gte=since,
+            timestamp__lt=closed_before,
+            transaction_type__in=list(rules),
+        )
+        .values_list('user_id', 'transaction_type', 'amount', 'timestamp')
+        .iterator()
+    )
+    for user_id, transaction_type, amount, timestamp in rows:
+        bucket = int(timestamp.timestamp()) // bucket_seconds
+        totals = buckets[(user_id, transaction_type, bucket)]
+        totals[0] += 1
+        totals[1] += storage_to_minor_units(amount)
+
+    counters = defaultdict(dict)
+    for (user_id, transaction_type, bucket), (count, total) in buckets.items():
+        for rule in rules[transaction_type]:
+            if bucket > now_bucket - window_buckets(rule['window']):
+                key = counter_key(user_id, transaction_type, rule['window'])
+                counters[key][f"c:{bucket}"] = count
+                counters[key][f"a:{bucket}"] = total
+
+    connection = _redis()
+    keys = set(counters)
+    for key in connection.scan_iter(match=f"{KEY_PREFIX}:*", count=1000):
+        keys.add(key.decode() if isinstance(key, bytes) else key)
+
+    merge = _script(MERGE_CLOSED_BUCKETS_SCRIPT)
+    pipe = connection.pipeline(transaction=False)
+    for key in keys:
+        window = int(key.rsplit(':', 1)[1])
+        fields = [item for field in counters.get(key, {}).items() for item in field]
+        merge(keys=[key], args=[open_from, window + bucket_seconds, *fields], client=pipe)
+    pipe.execute()
+    logger.info("Reconciled %s velocity counters", len(keys))
+    return len(keys)
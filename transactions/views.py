@@ -4,9 +4,12 @@ Import for logging
 import logging
 
 # Django imports
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
 from django.db import transaction
 from django.db.models import F, Q
-from django.core.cache import cache
 from django.contrib.auth.hashers import check_password
 from django.core.exceptions import ObjectDoesNotExist
 
@@ -16,14 +19,23 @@ from rest_framework.throttling import AnonRateThrottle
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.exceptions import NotFound, ValidationError
-from rest_framework_simplejwt.tokens import RefreshToken
-from transactions.tasks import process_transaction
+from rest_framework.exceptions import AuthenticationFailed, NotFound, Throttled, ValidationError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from transactions.tasks import (
+    process_transaction,
+    build_transaction_history,
+    refresh_transaction_history_cache
+)
 
 # Local imports
 from .serializers import UserSerializer, TransactionSerializer, AccountSerializer
 from .throttles import SignupAttemptThrottle, LoginAttemptThrottle
 from .models import User, Transaction, Account
+from .cache import history_cache, history_cache_key
+from .events import stream_events
+from .money import from_storage
+from .tokens import RedisRefreshToken
+from .velocity import VelocityLimitExceeded, check_and_record, release
 
 
 logger = logging.getLogger(__name__)
@@ -97,7 +109,7 @@ class UserLoginView(APIView):
             if user.is_active:
                 if isinstance(user, User):
                     print(f"User is instance of User model: {isinstance(user, User)}")
-                    refresh = RefreshToken.for_user(user)
+                    refresh = RedisRefreshToken.for_user(user)
                     return Response({
                         'refresh': str(refresh),
                         'access': str(refresh.access_token),
@@ -141,31 +153,54 @@ class TransactionView(generics.CreateAPIView):
     queryset = Transaction.objects.all() # pylint: disable=no-member
     serializer_class = TransactionSerializer
 
+    def create(self, request, *args, **kwargs):
+        """
+        Accepts the transaction for settlement and responds with 202.
+        """
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
     @transaction.atomic
     def perform_create(self, serializer):
         """
-        Handles user creation and associated account creation.
+        Queues the transaction for settlement by process_transaction, which
+        records it and updates the balance.
+        Rejects the transaction with 429 if it exceeds a velocity limit.
         """
+        validated = serializer.validated_data
+        try:
+            bucket = check_and_record(
+                self.request.user.id, validated['transaction_type'], validated['amount']
+            )
+        except VelocityLimitExceeded as exc:
+            raise Throttled(detail=str(exc)) from exc
+
         try:
-           transaction_instance = serializer.save(user=self.request.user)
+            account = self.request.user.account
+            if validated['transaction_type'] == 'withdrawal' and account.get_balance() < validated['amount']:
+                raise ValueError('Insufficient funds.')
 
-           print(f"Transaction created for user: {self.request.user.username}")
+            print(f"Transaction accepted for user: {self.request.user.username}")
 
-           validated = serializer.validated_data
-           transaction_data = {
+            transaction_data = {
                 k: v for k, v in validated.items() if k not in ['amount', 'transaction_type']
             }
 
-            # Schedule async processing after commit
-           transaction.on_commit(lambda: process_transaction.delay(
+            # Schedule async settlement after commit
+            transaction.on_commit(lambda: process_transaction.delay(
                 self.request.user.id,
-                validated['amount'],
+                str(from_storage(validated['amount'])),
                 validated['transaction_type'],
-                transaction_data
+                transaction_data,
+                bucket
             ))
 
         except Exception as e:
             print(f"Error during transaction creation: {e}")
+            release(
+                self.request.user.id, validated['transaction_type'], validated['amount'], bucket
+            )
             raise ValidationError(f"Failed to create transaction: {str(e)}") from e
 
 class TransactionHistoryView(generics.ListAPIView):
@@ -177,20 +212,74 @@ class TransactionHistoryView(generics.ListAPIView):
 
     def get_queryset(self):
         """
-        Retrieves the user's transaction history, using cache for performance.
+        Returns the user's transactions.
+        """
+        return Transaction.objects.filter(user=self.request.user) # pylint: disable=no-member
+
+    def get_history(self):
+        """
+        Retrieves the user's serialized transaction history, using the two-tier
+        cache for performance. Stale entries are served while a Celery task
+        refreshes them.
         """
         user = self.request.user
-        cache_key = f"transaction_history_{user.id}"
-        cache_timeout = 60 * 15
+        cache_key = history_cache_key(user.id)
 
-        cached_history = cache.get(cache_key)
-        if cached_history:
-            logger.info("Returning cached transaction history for user %s", user.id)
-            return cached_history
+        history = history_cache.get_or_set(
+            cache_key,
+            lambda: build_transaction_history(user.id),
+            refresh=lambda key, token: refresh_transaction_history_cache.delay(user.id, token)
+        )
+        logger.info("Returning transaction history for user %s", user.id)
+        return history
 
-        queryset = Transaction.objects.filter(user=user) # pylint: disable=no-member
-        serialized_data = TransactionSerializer(queryset, many=True).data # pylint: disable=no-member
-        cache.set(cache_key, serialized_data, timeout=cache_timeout)
-        logger.info("Cached transaction history for user %s", user.id)
+    def list(self, request, *args, **kwargs):
+        """
+        Pages through the cached history. Its entries were serialized when the
+        cache was built, so they are returned as-is instead of being passed
+        through the serializer a second time.
+        """
+        history = self.get_history()
+        page = self.paginate_queryset(history)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(history)
+
+class AccountEventStreamView(View):
+    """
+    Server-sent event stream of the authenticated user's balance changes and
+    settled transactions. Replaces polling `account/` and `transactions/`.
+    Clients resume after a disconnect by sending the `Last-Event-ID` header.
+    It must be served through ASGI: under WSGI every open stream would hold a
+    worker thread forever, so it responds with 501 instead. The stream closes
+    when the access token expires.
+    """
+    async def get(self, request):
+        """
+        Authenticates the JWT and opens the event stream.
+        """
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {'detail': 'The event stream is only available when served over ASGI.'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        try:
+            auth = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+            return JsonResponse(detail, status=status.HTTP_401_UNAUTHORIZED)
+        if auth is None:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
 
-        return queryset
+        user, token = auth
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        response = StreamingHttpResponse(
+            stream_events(user.id, last_event_id, expires_at=token['exp']),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response